@@ -25,7 +25,6 @@ $ ls -a mnt
 .  ..  _etc_passwd  .._foo_bar
 """
 
-import asyncio
 import dataclasses
 import os
 
@@ -42,7 +41,7 @@ from shenaniganfs.fs import (
     VerifyingFileHandleEncoder,
 )
 from shenaniganfs.fs_manager import EvictingFileSystemManager, create_fs
-from shenaniganfs.nfs_utils import serve_nfs
+from shenaniganfs.nfs_utils import run, serve_nfs
 
 
 @dataclasses.dataclass
@@ -113,6 +112,6 @@ async def main():
     await serve_nfs(fs_manager, use_internal_rpcbind=True)
 
 try:
-    asyncio.run(main())
+    run(main())
 except KeyboardInterrupt:
     pass
@@ -1,7 +1,6 @@
-import asyncio
 import os
 
-from shenaniganfs.nfs_utils import serve_nfs
+from shenaniganfs.nfs_utils import run, serve_nfs
 from shenaniganfs.fs import SimpleFS, SimpleDirectory, SimpleFile, VerifyingFileHandleEncoder
 from shenaniganfs.fs_manager import EvictingFileSystemManager, create_fs
 
@@ -46,6 +45,6 @@ async def main():
     await serve_nfs(fs_manager, use_internal_rpcbind=True)
 
 try:
-    asyncio.run(main())
+    run(main())
 except KeyboardInterrupt:
     pass
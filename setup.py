@@ -6,6 +6,20 @@ SCRIPT_DIR = path.abspath(path.dirname(__file__))
 with open(path.join(SCRIPT_DIR, 'README.md')) as f:
     long_description = f.read()
 
+# The compiled XDR codec is optional, rpchelp falls back to pure Python without it.
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    ext_modules = []
+else:
+    ext_modules = cythonize([
+        setuptools.Extension(
+            "shenaniganfs._xdr_fast",
+            ["shenaniganfs/_xdr_fast.pyx"],
+            optional=True,
+        ),
+    ])
+
 
 setuptools.setup(
     name="ShenanigaNFS",
@@ -17,6 +31,7 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/JordanMilne/ShenanigaNFS",
     packages=setuptools.find_packages(),
+    ext_modules=ext_modules,
     classifiers=[
         "Programming Language :: Python :: 3",
         "Programming Language :: Python :: 3.7",
@@ -26,6 +41,7 @@ setuptools.setup(
     ],
     extras_require={
         "rpcgen": ["ply~=3.11"],
+        "uvloop": ["uvloop>=0.18"],
     },
     python_requires='>=3.7',
 )
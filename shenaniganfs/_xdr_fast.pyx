@@ -0,0 +1,284 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""Compiled versions of rpchelp.PyPacker / rpchelp.PyUnpacker"""
+
+import struct
+import xdrlib
+
+from cpython.bytearray cimport PyByteArray_FromStringAndSize
+from cpython.bytes cimport PyBytes_FromStringAndSize
+from cpython.mem cimport PyMem_Free, PyMem_Malloc, PyMem_Realloc
+from libc.stdint cimport int32_t, int64_t, uint32_t, uint64_t
+from libc.string cimport memcpy, memset
+
+cdef Py_ssize_t INITIAL_CAPACITY = 256
+_F32 = struct.Struct("!f")
+
+
+cdef inline void store_u32(unsigned char *dst, uint32_t v) noexcept nogil:
+    dst[0] = (v >> 24) & 0xFF
+    dst[1] = (v >> 16) & 0xFF
+    dst[2] = (v >> 8) & 0xFF
+    dst[3] = v & 0xFF
+
+
+cdef inline uint32_t load_u32(const unsigned char *src) noexcept nogil:
+    return (<uint32_t>src[0] << 24) | (<uint32_t>src[1] << 16) | (<uint32_t>src[2] << 8) | src[3]
+
+
+cdef class Packer:
+    """Pack various data representations into a buffer."""
+    cdef unsigned char *buf
+    cdef Py_ssize_t pos
+    cdef Py_ssize_t cap
+
+    def __cinit__(self):
+        self.buf = <unsigned char *>PyMem_Malloc(INITIAL_CAPACITY)
+        if self.buf is NULL:
+            raise MemoryError()
+        self.cap = INITIAL_CAPACITY
+        self.pos = 0
+
+    def __dealloc__(self):
+        PyMem_Free(self.buf)
+
+    cdef unsigned char *_reserve(self, Py_ssize_t n) except NULL:
+        cdef Py_ssize_t new_cap
+        cdef unsigned char *new_buf
+        if self.pos + n > self.cap:
+            new_cap = max(self.cap * 2, self.pos + n)
+            new_buf = <unsigned char *>PyMem_Realloc(self.buf, new_cap)
+            if new_buf is NULL:
+                raise MemoryError()
+            self.buf = new_buf
+            self.cap = new_cap
+        self.pos += n
+        return self.buf + self.pos - n
+
+    cdef int _pack_u32(self, uint32_t v) except -1:
+        store_u32(self._reserve(4), v)
+        return 0
+
+    cpdef reset(self):
+        self.pos = 0
+
+    cpdef bytes get_buffer(self):
+        return PyBytes_FromStringAndSize(<char *>self.buf, self.pos)
+
+    def get_buf(self):
+        return self.get_buffer()
+
+    cpdef bytearray take_buffer(self):
+        """Hand off the packed data as a mutable buffer and reset the packer"""
+        buf = PyByteArray_FromStringAndSize(<char *>self.buf, self.pos)
+        self.pos = 0
+        return buf
+
+    cpdef pack_uint(self, x):
+        cdef uint32_t v
+        if not isinstance(x, int):
+            raise xdrlib.ConversionError("required argument is not an integer")
+        try:
+            v = x
+        except (OverflowError, TypeError) as e:
+            raise xdrlib.ConversionError(e.args[0]) from None
+        self._pack_u32(v)
+
+    cpdef pack_int(self, x):
+        cdef int32_t v
+        if not isinstance(x, int):
+            raise xdrlib.ConversionError("required argument is not an integer")
+        try:
+            v = x
+        except (OverflowError, TypeError) as e:
+            raise xdrlib.ConversionError(e.args[0]) from None
+        self._pack_u32(<uint32_t>v)
+
+    def pack_enum(self, x):
+        self.pack_int(x)
+
+    cpdef pack_bool(self, x):
+        self._pack_u32(1 if x else 0)
+
+    cpdef pack_uhyper(self, x):
+        cdef uint64_t v
+        try:
+            v = x & 0xFFFFFFFFFFFFFFFF
+        except (OverflowError, TypeError) as e:
+            raise xdrlib.ConversionError(e.args[0]) from None
+        self._pack_u32(<uint32_t>(v >> 32))
+        self._pack_u32(<uint32_t>v)
+
+    def pack_hyper(self, x):
+        self.pack_uhyper(x)
+
+    cpdef pack_float(self, x):
+        # Go through struct rather than a C float cast, which would silently
+        # turn out-of-range values into inf instead of raising OverflowError.
+        try:
+            packed = _F32.pack(x)
+        except struct.error as e:
+            raise xdrlib.ConversionError(e.args[0]) from None
+        memcpy(self._reserve(4), <const char *>packed, 4)
+
+    cpdef pack_double(self, x):
+        cdef double d
+        cdef uint64_t v
+        try:
+            d = x
+        except TypeError as e:
+            raise xdrlib.ConversionError(e.args[0]) from None
+        memcpy(&v, &d, 8)
+        self._pack_u32(<uint32_t>(v >> 32))
+        self._pack_u32(<uint32_t>v)
+
+    cpdef pack_fstring(self, Py_ssize_t n, s):
+        cdef const unsigned char[:] view
+        cdef Py_ssize_t data_len
+        cdef unsigned char *dst
+        if n < 0:
+            raise ValueError('fstring size must be nonnegative')
+        view = s
+        data_len = min(n, view.shape[0])
+        dst = self._reserve((n + 3) // 4 * 4)
+        if data_len:
+            memcpy(dst, &view[0], data_len)
+        # Short values get null-padded out to `n`, then everything to a multiple of 4
+        memset(dst + data_len, 0, (n + 3) // 4 * 4 - data_len)
+
+    def pack_fopaque(self, n, s):
+        self.pack_fstring(n, s)
+
+    cpdef pack_string(self, s):
+        cdef Py_ssize_t n = len(s)
+        self.pack_uint(n)
+        self.pack_fstring(n, s)
+
+    def pack_opaque(self, s):
+        self.pack_string(s)
+
+    def pack_bytes(self, s):
+        self.pack_string(s)
+
+    def pack_list(self, list, pack_item):
+        for item in list:
+            self._pack_u32(1)
+            pack_item(item)
+        self._pack_u32(0)
+
+    def pack_farray(self, n, list, pack_item):
+        if len(list) != n:
+            raise ValueError('wrong array size')
+        for item in list:
+            pack_item(item)
+
+    def pack_array(self, list, pack_item):
+        n = len(list)
+        self.pack_uint(n)
+        self.pack_farray(n, list, pack_item)
+
+
+cdef class Unpacker:
+    """Unpacks various data representations from the given buffer."""
+    cdef object data
+    cdef const unsigned char[:] view
+    cdef Py_ssize_t pos
+
+    def __init__(self, data):
+        self.reset(data)
+
+    cpdef reset(self, data):
+        self.data = data
+        self.view = data
+        self.pos = 0
+
+    def get_position(self):
+        return self.pos
+
+    def set_position(self, Py_ssize_t position):
+        self.pos = position
+
+    def get_buffer(self):
+        return self.data
+
+    def done(self):
+        if self.pos < self.view.shape[0]:
+            raise xdrlib.Error('unextracted data remains')
+
+    cdef const unsigned char *_consume(self, Py_ssize_t n) except NULL:
+        cdef Py_ssize_t i = self.pos
+        if i < 0 or i + n > self.view.shape[0]:
+            raise EOFError
+        self.pos = i + n
+        if n == 0:
+            # Don't index into an empty view
+            return <const unsigned char *>""
+        return &self.view[i]
+
+    cpdef unsigned int unpack_uint(self) except? 0xFFFFFFFF:
+        return load_u32(self._consume(4))
+
+    cpdef int unpack_int(self) except? -1:
+        return <int32_t>load_u32(self._consume(4))
+
+    def unpack_enum(self):
+        return self.unpack_int()
+
+    cpdef bint unpack_bool(self) except? -1:
+        return self.unpack_int() != 0
+
+    cpdef uint64_t unpack_uhyper(self) except? 0xFFFFFFFFFFFFFFFF:
+        cdef const unsigned char *src = self._consume(8)
+        return (<uint64_t>load_u32(src) << 32) | load_u32(src + 4)
+
+    cpdef int64_t unpack_hyper(self) except? -1:
+        return <int64_t>self.unpack_uhyper()
+
+    cpdef float unpack_float(self) except? -1:
+        cdef uint32_t v = load_u32(self._consume(4))
+        cdef float f
+        memcpy(&f, &v, 4)
+        return f
+
+    cpdef double unpack_double(self) except? -1:
+        cdef uint64_t v = self.unpack_uhyper()
+        cdef double d
+        memcpy(&d, &v, 8)
+        return d
+
+    cpdef bytes unpack_fstring(self, Py_ssize_t n):
+        if n < 0:
+            raise ValueError('fstring size must be nonnegative')
+        return PyBytes_FromStringAndSize(<const char *>self._consume((n + 3) // 4 * 4), n)
+
+    def unpack_fopaque(self, n):
+        return self.unpack_fstring(n)
+
+    cpdef bytes unpack_string(self):
+        return self.unpack_fstring(self.unpack_uint())
+
+    def unpack_opaque(self):
+        return self.unpack_string()
+
+    def unpack_bytes(self):
+        return self.unpack_string()
+
+    def unpack_list(self, unpack_item):
+        list = []
+        while 1:
+            x = self.unpack_uint()
+            if x == 0: break
+            if x != 1:
+                raise xdrlib.ConversionError('0 or 1 expected, got %r' % (x,))
+            item = unpack_item()
+            list.append(item)
+        return list
+
+    def unpack_farray(self, n, unpack_item):
+        list = []
+        for i in range(n):
+            list.append(unpack_item())
+        return list
+
+    def unpack_array(self, unpack_item):
+        n = self.unpack_uint()
+        return self.unpack_farray(n, unpack_item)
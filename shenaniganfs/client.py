@@ -1,14 +1,18 @@
 import abc
 import asyncio
 import random
-import xdrlib
 from typing import *
 
 from shenaniganfs.generated.rfc1831 import *
+from shenaniganfs.rpchelp import Packer, Unpacker, _U32
 from shenaniganfs.transport import BaseTransport, Prog, SPLIT_MSG, TCPTransport
 
 _T = TypeVar("T")
 
+# Where the per-call fields sit in a packed CALL header
+_CALL_XID_OFFSET = 0
+_CALL_PROC_OFFSET = 20
+
 
 class UnpackedRPCMsg(Generic[_T]):
     """Wrapper for a parsed message header and parsed return data"""
@@ -39,9 +43,9 @@ class UnpackedRPCMsg(Generic[_T]):
     def success(self):
         if self.msg.header.mtype != REPLY:
             raise ValueError("Tried to check success of call message?")
-        if self.msg.header.rbody.stat != ReplyStat.MSG_ACCEPTED:
+        if self.msg.header.rbody.stat != MSG_ACCEPTED:
             return False
-        if self.msg.header.rbody.areply.data.stat != AcceptStat.SUCCESS:
+        if self.msg.header.rbody.areply.data.stat != SUCCESS:
             return False
         return True
 
@@ -52,6 +56,10 @@ class BaseClient(Prog):
     def __init__(self):
         super().__init__()
         self.xid_map: Dict[int, asyncio.Future] = {}
+        # Random start so xids don't repeat across reconnects / client instances
+        self._last_xid = random.getrandbits(32)
+        self._call_template: bytes = b""
+        self._call_template_key: Optional[Tuple[int, int]] = None
 
     def __del__(self):
         try:
@@ -80,13 +88,8 @@ class BaseClient(Prog):
             self.transport = None
 
     def pack_args(self, proc_id: int, args: Sequence):
-        packer = xdrlib.Packer()
-        arg_specs = self.procs[proc_id].arg_types
-        if len(args) != len(arg_specs):
-            raise ValueError("Wrong number of arguments!")
-
-        for spec, arg in zip(arg_specs, args):
-            spec.pack(packer, arg)
+        packer = Packer()
+        self.procs[proc_id].pack_args(packer, args)
         return packer.get_buffer()
 
     def kill_futures(self, exc: Exception):
@@ -96,23 +99,58 @@ class BaseClient(Prog):
         self.xid_map.clear()
 
     def pump_reply(self, msg: SPLIT_MSG):
-        reply, _ = msg
-        xid_future = self.xid_map.pop(reply.xid, None)
-        if not xid_future:
+        reply = msg[0]
+        try:
+            xid_future = self.xid_map.pop(reply.xid)
+        except KeyError:
             # Got a reply for a message we didn't send???
             return
-        if reply.header.mtype == MsgType.REPLY:
+        mtype = reply.header.mtype
+        if mtype == REPLY:
             xid_future.set_result(msg)
         else:
-            xid_future.set_exception(ValueError(f"Expected REPLY, got {reply.header.mtype}"))
+            xid_future.set_exception(ValueError(f"Expected REPLY, got {mtype}"))
+
+    def unpack_return(self, proc_id: int, body: memoryview):
+        return self.procs[proc_id].ret_type.unpack(Unpacker(body))
+
+    def _make_call_header(self, xid: int, proc_id: int) -> bytearray:
+        # Only the xid and proc change between calls, so pack the rest once
+        if self._call_template_key != (self.prog, self.vers):
+            p = Packer()
+            RPCMsg.pack(p, RPCMsg(
+                xid=0,
+                header=RPCBody(
+                    mtype=MsgType.CALL,
+                    cbody=CallBody(
+                        rpcvers=2,
+                        prog=self.prog,
+                        vers=self.vers,
+                        proc=0,
+                        # always null auth for now
+                        cred=OpaqueAuth(
+                            flavor=AuthFlavor.AUTH_NONE,
+                            body=b""
+                        ),
+                        verf=OpaqueAuth(
+                            flavor=AuthFlavor.AUTH_NONE,
+                            body=b""
+                        ),
+                    )
+                )
+            ))
+            self._call_template = p.get_buffer()
+            self._call_template_key = (self.prog, self.vers)
 
-    def unpack_return(self, proc_id: int, body: bytes):
-        unpacker = xdrlib.Unpacker(body)
-        return self.procs[proc_id].ret_type.unpack(unpacker)
+        header = bytearray(self._call_template)
+        _U32.pack_into(header, _CALL_XID_OFFSET, xid)
+        _U32.pack_into(header, _CALL_PROC_OFFSET, proc_id)
+        return header
 
-    @staticmethod
-    def gen_xid() -> int:
-        return random.getrandbits(32)
+    def gen_xid(self) -> int:
+        # xids only need to be unique among outstanding calls, a counter does the job.
+        self._last_xid = (self._last_xid + 1) & 0xFFFFFFFF
+        return self._last_xid
 
     async def send_call(self, proc_id: int, *args, xid: Optional[int] = None) -> UnpackedRPCMsg[_T]:
         if xid is None:
@@ -120,39 +158,42 @@ class BaseClient(Prog):
         if not self.transport:
             await self.connect()
 
-        msg = RPCMsg(
-            xid=xid,
-            header=RPCBody(
-                mtype=MsgType.CALL,
-                cbody=CallBody(
-                    rpcvers=2,
-                    prog=self.prog,
-                    vers=self.vers,
-                    proc=proc_id,
-                    # always null auth for now
-                    cred=OpaqueAuth(
-                        flavor=AuthFlavor.AUTH_NONE,
-                        body=b""
-                    ),
-                    verf=OpaqueAuth(
-                        flavor=AuthFlavor.AUTH_NONE,
-                        body=b""
-                    ),
-                )
-            )
-        )
         fut = asyncio.Future()
         self.xid_map[xid] = fut
-        await self.transport.write_msg(msg, self.pack_args(proc_id, args))
+        await self.transport.write_msg(self._make_call_header(xid, proc_id), self.pack_args(proc_id, args))
 
         # TODO: timeout?
-        reply_msg = await fut
+        return self._unpack_reply(proc_id, await fut)
+
+    async def send_many(self, calls: Iterable[Tuple[int, Sequence]]) -> List[UnpackedRPCMsg]:
+        """Send a batch of (proc_id, args) calls in a single write, returning replies in order"""
+        if not self.transport:
+            await self.connect()
+
+        xids = []
+        proc_ids = []
+        msgs = []
+        for proc_id, args in calls:
+            xid = self.gen_xid()
+            msgs.append((self._make_call_header(xid, proc_id), self.pack_args(proc_id, args)))
+            xids.append(xid)
+            proc_ids.append(proc_id)
+
+        # Only register the calls once they've all packed successfully
+        futs = [asyncio.Future() for _ in xids]
+        self.xid_map.update(zip(xids, futs))
+        await self.transport.write_msgs(msgs)
+
+        replies = await asyncio.gather(*futs)
+        return [self._unpack_reply(proc_id, reply_msg) for proc_id, reply_msg in zip(proc_ids, replies)]
+
+    def _unpack_reply(self, proc_id: int, reply_msg: SPLIT_MSG) -> UnpackedRPCMsg:
         reply: RPCMsg = reply_msg[0]
-        reply_body_bytes: bytes = reply_msg[1]
+        reply_body_bytes: memoryview = reply_msg[1]
 
         assert(reply.header.mtype == REPLY)
         rbody = reply.header.rbody
-        if rbody.stat != ReplyStat.MSG_ACCEPTED or rbody.areply.data.stat != AcceptStat.SUCCESS:
+        if rbody.stat != MSG_ACCEPTED or rbody.areply.data.stat != SUCCESS:
             return UnpackedRPCMsg(reply, None)
         return UnpackedRPCMsg(reply, self.unpack_return(proc_id, reply_body_bytes))
 
@@ -1,3 +1,6 @@
+import asyncio
+from typing import *
+
 from shenaniganfs.fs_manager import FileSystemManager
 from shenaniganfs.nfs2 import MountV1Service, NFSV2Service
 from shenaniganfs.nfs3 import MountV3Service, NFSV3Service
@@ -31,3 +34,12 @@ async def serve_nfs(fs_manager: FileSystemManager, use_internal_rpcbind=True):
 
     async with server:
         await server.serve_forever()
+
+
+def run(main: Coroutine):
+    """`asyncio.run()`, on uvloop's faster event loop if it's installed"""
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.run(main)
+    return uvloop.run(main)
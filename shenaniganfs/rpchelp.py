@@ -36,6 +36,7 @@
 import abc
 import dataclasses
 import enum
+import struct
 import typing
 import xdrlib
 
@@ -59,6 +60,195 @@ class BadUnionSwitchException(Exception):
     pass
 
 
+_U32 = struct.Struct("!L")
+_I32 = struct.Struct("!l")
+_U64 = struct.Struct("!Q")
+_I64 = struct.Struct("!q")
+_F32 = struct.Struct("!f")
+_F64 = struct.Struct("!d")
+_BOOLS = (b"\0\0\0\0", b"\0\0\0\1")
+_PADDING = (b"", b"\0\0\0", b"\0\0", b"\0")
+
+
+class PyPacker(xdrlib.Packer):
+    """xdrlib.Packer using precompiled struct codecs and a single bytearray"""
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def reset(self):
+        self._buf = bytearray()
+
+    def get_buffer(self) -> bytes:
+        return bytes(self._buf)
+
+    get_buf = get_buffer
+
+    def take_buffer(self) -> bytearray:
+        """Hand off the packed data as a mutable buffer and reset the packer"""
+        buf = self._buf
+        self._buf = bytearray()
+        return buf
+
+    def pack_uint(self, x):
+        try:
+            self._buf += _U32.pack(x)
+        except struct.error as e:
+            raise xdrlib.ConversionError(e.args[0]) from None
+
+    def pack_int(self, x):
+        try:
+            self._buf += _I32.pack(x)
+        except struct.error as e:
+            raise xdrlib.ConversionError(e.args[0]) from None
+
+    pack_enum = pack_int
+
+    def pack_bool(self, x):
+        self._buf += _BOOLS[bool(x)]
+
+    def pack_uhyper(self, x):
+        try:
+            self._buf += _U64.pack(x & 0xFFFFFFFFFFFFFFFF)
+        except (TypeError, struct.error) as e:
+            raise xdrlib.ConversionError(e.args[0]) from None
+
+    pack_hyper = pack_uhyper
+
+    def pack_float(self, x):
+        try:
+            self._buf += _F32.pack(x)
+        except struct.error as e:
+            raise xdrlib.ConversionError(e.args[0]) from None
+
+    def pack_double(self, x):
+        try:
+            self._buf += _F64.pack(x)
+        except struct.error as e:
+            raise xdrlib.ConversionError(e.args[0]) from None
+
+    def pack_fstring(self, n, s):
+        if n < 0:
+            raise ValueError('fstring size must be nonnegative')
+        buf = self._buf
+        buf += s[:n]
+        # Short values get null-padded out to `n`, then everything to a multiple of 4
+        buf += b"\0" * (n - min(n, len(s))) + _PADDING[n % 4]
+
+    pack_fopaque = pack_fstring
+
+    def pack_string(self, s):
+        n = len(s)
+        self._buf += _U32.pack(n)
+        self.pack_fstring(n, s)
+
+    pack_opaque = pack_string
+    pack_bytes = pack_string
+
+
+class PyUnpacker(xdrlib.Unpacker):
+    """xdrlib.Unpacker using precompiled struct codecs"""
+
+    def __init__(self, data):
+        self._buf = data
+        self._pos = 0
+
+    def reset(self, data):
+        self._buf = data
+        self._pos = 0
+
+    def get_position(self):
+        return self._pos
+
+    def set_position(self, position):
+        self._pos = position
+
+    def get_buffer(self):
+        return self._buf
+
+    def done(self):
+        if self._pos < len(self._buf):
+            raise xdrlib.Error('unextracted data remains')
+
+    def _unpack_from(self, codec: struct.Struct):
+        i = self._pos
+        try:
+            val = codec.unpack_from(self._buf, i)[0]
+        except struct.error:
+            raise EOFError from None
+        self._pos = i + codec.size
+        return val
+
+    def unpack_uint(self):
+        i = self._pos
+        try:
+            val = _U32.unpack_from(self._buf, i)[0]
+        except struct.error:
+            raise EOFError from None
+        self._pos = i + 4
+        return val
+
+    def unpack_int(self):
+        i = self._pos
+        try:
+            val = _I32.unpack_from(self._buf, i)[0]
+        except struct.error:
+            raise EOFError from None
+        self._pos = i + 4
+        return val
+
+    unpack_enum = unpack_int
+
+    def unpack_bool(self):
+        return bool(self.unpack_int())
+
+    def unpack_uhyper(self):
+        return self._unpack_from(_U64)
+
+    def unpack_hyper(self):
+        return self._unpack_from(_I64)
+
+    def unpack_float(self):
+        return self._unpack_from(_F32)
+
+    def unpack_double(self):
+        return self._unpack_from(_F64)
+
+    def unpack_fstring(self, n):
+        if n < 0:
+            raise ValueError('fstring size must be nonnegative')
+        i = self._pos
+        j = i + (n + 3) // 4 * 4
+        if j > len(self._buf):
+            raise EOFError
+        self._pos = j
+        # We may be reading from a memoryview, make sure callers get real bytes
+        return bytes(self._buf[i:i + n])
+
+    unpack_fopaque = unpack_fstring
+
+    def unpack_string(self):
+        return self.unpack_fstring(self.unpack_uint())
+
+    unpack_opaque = unpack_string
+    unpack_bytes = unpack_string
+
+
+try:
+    from shenaniganfs._xdr_fast import Packer, Unpacker
+except ImportError:
+    Packer = PyPacker
+    Unpacker = PyUnpacker
+
+
+def _pack_opaque(p, val):
+    p.pack_opaque(val)
+
+
+def _unpack_opaque(up):
+    return up.unpack_opaque()
+
+
 class Packable:
     @abc.abstractmethod
     def unpack(self, up: xdrlib.Unpacker):
@@ -117,6 +307,10 @@ class Opaque(Packable):
         self.length = length
         self.fixed_len = fixed_len
         assert (not (fixed_len and length is None))
+        if not fixed_len:
+            # Nothing to check, skip straight to the packer's primitives
+            self.pack = _pack_opaque
+            self.unpack = _unpack_opaque
 
     @classmethod
     def type_hint(cls):
@@ -156,6 +350,106 @@ class StructUnionBase(Packable, abc.ABC):
         return {f.name: f for f in cls.get_fields()}
 
 
+class _StructCodec(typing.NamedTuple):
+    pack: typing.Callable
+    unpack: typing.Callable
+    # Only set for single-field structs, which may be (un)packed as the bare value
+    pack_single: typing.Optional[typing.Callable]
+    unpack_single: typing.Optional[typing.Callable]
+
+
+def _unpack_run(up, run_struct: struct.Struct) -> tuple:
+    pos = up.get_position()
+    try:
+        vals = run_struct.unpack_from(up.get_buffer(), pos)
+    except struct.error:
+        raise EOFError from None
+    up.set_position(pos + run_struct.size)
+    return vals
+
+
+def _fixed_format(serializer) -> typing.Optional[typing.Tuple[str, typing.Optional[typing.Callable]]]:
+    """Get the struct format and unpack-side conversion for a fixed-size primitive"""
+    if isinstance_or_subclass(serializer, Enum):
+        return "l", serializer.from_int
+    try:
+        return _FIXED_FORMATS.get(serializer)
+    except TypeError:
+        # Unhashable serializer, can't be one of ours
+        return None
+
+
+def _compile_struct_codec(cls) -> _StructCodec:
+    """
+    Generate pack / unpack functions specialized to the fields of `cls`
+
+    Field lookups and serializer dispatch happen once here rather than on
+    every call, and runs of adjacent fixed-size primitives are (un)packed
+    with a single precompiled `struct.Struct`.
+    """
+    fields = cls.get_fields()
+    ns = {"cls": cls, "struct": struct, "_unpack_run": _unpack_run}
+    pack_lines = []
+    unpack_lines = []
+    kwargs = []
+
+    for i, field in enumerate(fields):
+        serializer = field.metadata["serializer"]
+        ns[f"_p{i}"] = serializer.pack
+        ns[f"_u{i}"] = serializer.unpack
+
+    i = 0
+    while i < len(fields):
+        run = []
+        while i + len(run) < len(fields):
+            fmt = _fixed_format(fields[i + len(run)].metadata["serializer"])
+            if fmt is None:
+                break
+            run.append(fmt)
+
+        if len(run) < 2:
+            name = fields[i].name
+            pack_lines.append(f"    _p{i}(p, val.{name})")
+            unpack_lines.append(f"    v{i} = _u{i}(up)")
+            kwargs.append(f"{name}=v{i}")
+            i += 1
+            continue
+
+        idxs = range(i, i + len(run))
+        run_struct = struct.Struct("!" + "".join(fmt for fmt, _ in run))
+        ns[f"_s{i}"] = run_struct
+
+        pack_vals = []
+        for j, (_, conv) in zip(idxs, run):
+            # pack_bool() normalizes to 0 / 1, so we have to as well
+            pack_vals.append(f"(1 if val.{fields[j].name} else 0)" if conv is bool else f"val.{fields[j].name}")
+        # Anything struct won't take goes through the regular packers so
+        # we get the same coercion and errors.
+        pack_lines.append("    try:")
+        pack_lines.append(f"        p.pack_fopaque({run_struct.size}, _s{i}.pack({', '.join(pack_vals)}))")
+        pack_lines.append("    except struct.error:")
+        pack_lines.extend(f"        _p{j}(p, val.{fields[j].name})" for j in idxs)
+
+        unpack_lines.append(f"    {', '.join(f'v{j}' for j in idxs)}, = _unpack_run(up, _s{i})")
+        for j, (_, conv) in zip(idxs, run):
+            if conv is not None:
+                ns[f"_c{j}"] = conv
+                kwargs.append(f"{fields[j].name}=_c{j}(v{j})")
+            else:
+                kwargs.append(f"{fields[j].name}=v{j}")
+        i += len(run)
+
+    codegen = "def pack(p, val):\n" + "\n".join(pack_lines or ["    pass"]) + "\n"
+    codegen += "def unpack(up):\n" + "".join(line + "\n" for line in unpack_lines)
+    codegen += f"    return cls({', '.join(kwargs)})\n"
+    exec(codegen, ns)
+
+    pack_single = unpack_single = None
+    if len(fields) == 1:
+        pack_single, unpack_single = ns["_p0"], ns["_u0"]
+    return _StructCodec(ns["pack"], ns["unpack"], pack_single, unpack_single)
+
+
 @dataclasses.dataclass
 class Struct(StructUnionBase, abc.ABC):
     def __init__(self, *args, **kwargs):
@@ -166,22 +460,28 @@ class Struct(StructUnionBase, abc.ABC):
         return len(cls.get_fields()) == 1
 
     @classmethod
-    def pack(cls, p, val, want_single=False):
-        if cls.have_single_field() and want_single:
-            cls.get_fields()[0].metadata["serializer"].pack(p, val)
-            return
+    def _get_codec(cls) -> _StructCodec:
+        # Check our own __dict__ so subclasses don't pick up their parent's codec
+        codec = cls.__dict__.get("_codec")
+        if codec is None:
+            codec = _compile_struct_codec(cls)
+            cls._codec = codec
+        return codec
 
-        for field in cls.get_fields():
-            field.metadata["serializer"].pack(p, getattr(val, field.name))
+    @classmethod
+    def pack(cls, p, val, want_single=False):
+        codec = cls._get_codec()
+        if want_single and codec.pack_single is not None:
+            codec.pack_single(p, val)
+        else:
+            codec.pack(p, val)
 
     @classmethod
     def unpack(cls, up, want_single=False):
-        fields = cls.get_fields()
-        if cls.have_single_field() and want_single:
-            return fields[0].metadata["serializer"].unpack(up)
-        return cls(
-            **{f.name: f.metadata["serializer"].unpack(up) for f in fields}
-        )
+        codec = cls._get_codec()
+        if want_single and codec.unpack_single is not None:
+            return codec.unpack_single(up)
+        return codec.unpack(up)
 
     @classmethod
     def type_hint(cls, want_single=False) -> str:
@@ -235,26 +535,45 @@ class Union(StructUnionBase, abc.ABC):
             return None, None
         return field_name, cls.get_fields_dict()[field_name].metadata["serializer"]
 
+    @classmethod
+    def _get_codec(cls):
+        codec = cls.__dict__.get("_codec")
+        if codec is None:
+            switch_field = cls.get_fields()[0]
+            # Resolve every arm up front so (un)packing is a single dict lookup
+            arms = {}
+            for sw_val in cls.SWITCH_OPTIONS:
+                arms[sw_val] = cls._get_switch_details(sw_val)
+            codec = (switch_field.name, switch_field.metadata["serializer"], arms, arms.get(None))
+            cls._codec = codec
+        return codec
+
     @classmethod
     def type_hint(cls) -> str:
         return cls.__name__
 
     @classmethod
     def pack(cls, p, val):
-        switch_field = cls.get_fields()[0]
-        sw_val = getattr(val, switch_field.name)
-        switch_field.metadata["serializer"].pack(p, sw_val)
+        switch_name, switch_type, arms, default_arm = cls._get_codec()
+        sw_val = getattr(val, switch_name)
+        switch_type.pack(p, sw_val)
 
-        name, typ = cls._get_switch_details(sw_val)
+        arm = arms.get(sw_val, default_arm)
+        if arm is None:
+            raise BadUnionSwitchException(sw_val)
+        name, typ = arm
         # There's a data field associated with this case
         if name is not None:
             typ.pack(p, getattr(val, name))
 
     @classmethod
     def unpack(cls, up):
-        switch_field = cls.get_fields()[0]
-        sw_val = switch_field.metadata["serializer"].unpack(up)
-        name, typ = cls._get_switch_details(sw_val)
+        _, switch_type, arms, default_arm = cls._get_codec()
+        sw_val = switch_type.unpack(up)
+        arm = arms.get(sw_val, default_arm)
+        if arm is None:
+            raise BadUnionSwitchException(sw_val)
+        name, typ = arm
         if name is not None:
             return cls(sw_val, **{name: typ.unpack(up)})
         return cls(sw_val)
@@ -300,15 +619,10 @@ class OptData(Packable):
 
 class BaseType(Packable):
     def __init__(self, p, up, python_type: typing.Optional[typing.Type]):
-        self.p_proc = p
-        self.up_proc = up
         self.python_type = python_type
-
-    def pack(self, p, val):
-        self.p_proc(p, val)
-
-    def unpack(self, up):
-        return self.up_proc(up)
+        # The primitives are used as pack() / unpack() directly, no need to bounce through a method
+        self.pack = p
+        self.unpack = up
 
     def type_hint(self) -> str:
         if self.python_type is None:
@@ -327,22 +641,43 @@ class Enum(Packable, enum.IntEnum):
 
     @classmethod
     def unpack(cls, up: xdrlib.Unpacker):
-        return cls(up.unpack_int())
+        return cls.from_int(up.unpack_int())
 
-
-# r_ prefix to avoid shadowing Python names
-r_uint = BaseType(xdrlib.Packer.pack_uint, xdrlib.Unpacker.unpack_uint, int)
-r_int = BaseType(xdrlib.Packer.pack_int, xdrlib.Unpacker.unpack_int, int)
-r_bool = BaseType(xdrlib.Packer.pack_bool, xdrlib.Unpacker.unpack_bool, bool)
+    @classmethod
+    def from_int(cls, val: int):
+        # Much cheaper than going through the metaclass' __call__
+        member = cls._value2member_map_.get(val)
+        if member is None:
+            return cls(val)
+        return member
+
+
+# r_ prefix to avoid shadowing Python names.
+# Dispatch by name so these work with any Packer / Unpacker implementation
+r_uint = BaseType(lambda p, v: p.pack_uint(v), lambda up: up.unpack_uint(), int)
+r_int = BaseType(lambda p, v: p.pack_int(v), lambda up: up.unpack_int(), int)
+r_bool = BaseType(lambda p, v: p.pack_bool(v), lambda up: up.unpack_bool(), bool)
 r_void = BaseType(lambda p, v: None, lambda up: None, None)
-r_hyper = BaseType(xdrlib.Packer.pack_hyper, xdrlib.Unpacker.unpack_hyper, int)
-r_uhyper = BaseType(xdrlib.Packer.pack_uhyper, xdrlib.Unpacker.unpack_uhyper, int)
-r_float = BaseType(xdrlib.Packer.pack_float, xdrlib.Unpacker.unpack_float, float)
-r_double = BaseType(xdrlib.Packer.pack_double, xdrlib.Unpacker.unpack_double, float)
-r_opaque = BaseType(xdrlib.Packer.pack_opaque, xdrlib.Unpacker.unpack_opaque, bytes)
+r_hyper = BaseType(lambda p, v: p.pack_hyper(v), lambda up: up.unpack_hyper(), int)
+r_uhyper = BaseType(lambda p, v: p.pack_uhyper(v), lambda up: up.unpack_uhyper(), int)
+r_float = BaseType(lambda p, v: p.pack_float(v), lambda up: up.unpack_float(), float)
+r_double = BaseType(lambda p, v: p.pack_double(v), lambda up: up.unpack_double(), float)
+r_opaque = BaseType(lambda p, v: p.pack_opaque(v), lambda up: up.unpack_opaque(), bytes)
 r_string = r_opaque
 # XXX should add quadruple, but no direct Python support for it.
 
+# Struct formats for fixed-size primitives, plus any conversion their unpacker applies.
+# Used to (un)pack runs of these in one go, see `_compile_struct_codec()`.
+_FIXED_FORMATS = {
+    r_uint: ("L", None),
+    r_int: ("l", None),
+    r_bool: ("l", bool),
+    r_hyper: ("q", None),
+    r_uhyper: ("Q", None),
+    r_float: ("f", None),
+    r_double: ("d", None),
+}
+
 
 class Proc:
     """Manage a RPC procedure definition."""
@@ -351,6 +686,18 @@ class Proc:
         self.name = name
         self.ret_type: Packable = ret_type
         self.arg_types: typing.List[Packable] = arg_types
+        # Bind the (un)packers up front so per-call marshalling skips the lookups
+        self._arg_packers = tuple(arg_type.pack for arg_type in arg_types)
+        self._arg_unpackers = tuple(arg_type.unpack for arg_type in arg_types)
+
+    def pack_args(self, p: Packer, args: typing.Sequence):
+        if len(args) != len(self._arg_packers):
+            raise ValueError("Wrong number of arguments!")
+        for pack, arg in zip(self._arg_packers, args):
+            pack(p, arg)
+
+    def unpack_args(self, up: Unpacker) -> typing.List:
+        return [unpack(up) for unpack in self._arg_unpackers]
 
     def __str__(self):
         return "Proc: %s %s %s" % (self.name, str(self.ret_type),
@@ -1,12 +1,14 @@
 import abc
 import asyncio
 import itertools
+import traceback
 from typing import *
 
 from shenaniganfs.client import TCPClient
 from shenaniganfs.generated.rfc1831 import *
 import shenaniganfs.generated.rfc1833_rpcbind as rpcbind
 from shenaniganfs.portmanager import PortBinding, PortManager
+from shenaniganfs.rpchelp import Packer, _U32
 from shenaniganfs.transport import SPLIT_MSG, BaseTransport, TCPTransport, CallContext, Prog
 
 
@@ -33,15 +35,15 @@ class TransportServer:
 
     async def handle_message(self, transport: BaseTransport, msg: SPLIT_MSG):
         call, body_bytes = msg
-        if call.header.mtype == MsgType.CALL:
+        if call.header.mtype == CALL:
             await self.handle_call(transport, call, body_bytes)
         else:
             # TODO: what's the proper error code for this?
-            err_msg = self.make_reply(call.xid, ReplyStat.MSG_ACCEPTED, AcceptStat.GARBAGE_ARGS)
+            err_msg = self.make_reply_bytes(call.xid, MSG_ACCEPTED, GARBAGE_ARGS)
             await transport.write_msg(err_msg, b"")
 
-    async def handle_call(self, transport: BaseTransport, call: RPCMsg, call_body_bytes: bytes):
-        stat = AcceptStat.SUCCESS
+    async def handle_call(self, transport: BaseTransport, call: RPCMsg, call_body_bytes: memoryview):
+        stat = SUCCESS
         mismatch: Optional[MismatchInfo] = None
         handler_ret = b""
         cbody = call.header.cbody
@@ -54,28 +56,28 @@ class TransportServer:
                     call_ctx = CallContext(transport, call)
                     handler_ret = await vers_progs[0].handle_proc_call(call_ctx, cbody.proc, call_body_bytes)
                     if isinstance(handler_ret, ReplyBody):
-                        reply_header = RPCMsg(call.xid, RPCBody(MsgType.REPLY, rbody=handler_ret))
+                        reply_header = RPCMsg(call.xid, RPCBody(REPLY, rbody=handler_ret))
                         await transport.write_msg(reply_header, b"")
                         return
                 else:
                     prog_versions = itertools.chain(*[(p.vers, p.min_vers) for p in progs])
                     prog_versions = list(x for x in prog_versions if x is not None)
                     mismatch = MismatchInfo(min(prog_versions), max(prog_versions))
-                    stat = AcceptStat.PROG_MISMATCH
+                    stat = PROG_MISMATCH
             else:
-                stat = AcceptStat.PROG_UNAVAIL
+                stat = PROG_UNAVAIL
 
         except NotImplementedError:
-            stat = AcceptStat.PROC_UNAVAIL
+            stat = PROC_UNAVAIL
         except Exception:
             print(f"Failed in {cbody.prog}.{cbody.vers}.{cbody.proc}")
-            reply_header = self.make_reply(call.xid, ReplyStat.MSG_ACCEPTED, AcceptStat.SYSTEM_ERR)
+            reply_header = self.make_reply_bytes(call.xid, MSG_ACCEPTED, SYSTEM_ERR)
             await transport.write_msg(reply_header, b"")
             # Might not be able to gracefully handle this. try to kill the transport.
             transport.close()
             raise
 
-        reply_header = self.make_reply(call.xid, ReplyStat.MSG_ACCEPTED, stat, mismatch)
+        reply_header = self.make_reply_bytes(call.xid, MSG_ACCEPTED, stat, mismatch)
         await transport.write_msg(reply_header, handler_ret)
 
     @staticmethod
@@ -101,8 +103,35 @@ class TransportServer:
             )
         )
 
+    @classmethod
+    def make_reply_bytes(cls, xid, stat: ReplyStat = 0, msg_stat: Union[AcceptStat, RejectStat] = 0,
+                         mismatch: Optional[MismatchInfo] = None) -> bytearray:
+        """Like make_reply(), but packed and cached for the common case"""
+        if mismatch is not None:
+            p = Packer()
+            RPCMsg.pack(p, cls.make_reply(xid, stat, msg_stat, mismatch))
+            return p.take_buffer()
+
+        # Packed reply headers keyed on (stat, msg_stat), with a zeroed xid.
+        # Check our own __dict__ so subclasses with their own make_reply() get their own templates.
+        templates = cls.__dict__.get("_reply_templates")
+        if templates is None:
+            templates = {}
+            cls._reply_templates = templates
+        template = templates.get((stat, msg_stat))
+        if template is None:
+            p = Packer()
+            RPCMsg.pack(p, cls.make_reply(0, stat, msg_stat))
+            template = templates[(stat, msg_stat)] = p.get_buffer()
+        reply = bytearray(template)
+        _U32.pack_into(reply, 0, xid)
+        return reply
+
 
 class TCPTransportServer(TransportServer):
+    # How many calls from a single connection may be in flight at once
+    MAX_CONCURRENT_CALLS = 8
+
     def __init__(self, bind_host, bind_port):
         super().__init__()
         self.bind_host, self.bind_port = bind_host, bind_port
@@ -112,17 +141,61 @@ class TCPTransportServer(TransportServer):
 
     async def handle_connection(self, reader, writer):
         transport = TCPTransport(reader, writer)
-        while not transport.closed:
+        # Keep reading while earlier calls are still being handled, replies
+        # go out in whatever order they finish in and get matched up by xid.
+        # Calls only get a task while they're being handled, so idle
+        # connections don't cost anything beyond this coroutine.
+        call_slots = asyncio.Semaphore(self.MAX_CONCURRENT_CALLS)
+        in_flight: Set[asyncio.Task] = set()
+        errors: List[BaseException] = []
+
+        def _gave_up() -> bool:
+            # Not `transport.closed`, that's also true once the peer half-closes,
+            # and calls it sent before that should still get handled.
+            return bool(errors) or writer.is_closing()
+
+        async def _handle_message(msg: SPLIT_MSG):
             try:
-                read_ret = await asyncio.wait_for(transport.read_msg(), 1)
-            except asyncio.TimeoutError:
-                continue
-            except asyncio.IncompleteReadError:
+                # Don't start anything new once a call has failed, the client
+                # would never see the reply to a call with side effects.
+                if not _gave_up():
+                    await self.handle_message(transport, msg)
+            except Exception as e:
+                if errors:
+                    # Only the first failure gets raised, don't lose the rest
+                    print(f"Call failed after connection to {transport.client_addr!r} was closing:")
+                    traceback.print_exception(type(e), e, e.__traceback__)
+                else:
+                    errors.append(e)
                 transport.close()
-                break
+            finally:
+                call_slots.release()
 
-            await self.handle_message(transport, read_ret)
-        transport.close()
+        try:
+            # No need to poll `closed`, the read fails with IncompleteReadError once
+            # the connection goes away, whichever side closes it.
+            while not transport.closed:
+                await call_slots.acquire()
+                if _gave_up():
+                    break
+                try:
+                    msg = await transport.read_msg()
+                except asyncio.IncompleteReadError:
+                    break
+                # A call may have failed while we were waiting on the read
+                if _gave_up():
+                    break
+                task = asyncio.ensure_future(_handle_message(msg))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            # Let anything still in flight finish off
+            await asyncio.gather(*in_flight)
+            if errors:
+                raise errors[0]
+        finally:
+            for task in in_flight:
+                task.cancel()
+            transport.close()
 
     def get_prog_port_binding(self, prog: Prog) -> PortBinding:
         return PortBinding(
@@ -1,20 +1,30 @@
 import abc
 import asyncio
-import struct
-import xdrlib
-from io import BytesIO
 from typing import *
 
 from shenaniganfs.generated.rfc1831 import *
-from shenaniganfs.rpchelp import Proc
+from shenaniganfs.rpchelp import Packer, Proc, Unpacker, _U32
 
-SPLIT_MSG = Tuple[RPCMsg, bytes]
+SPLIT_MSG = Tuple[RPCMsg, memoryview]
 
 _T = TypeVar("T")
 ProcRet = Union[ReplyBody, _T]
 
+LAST_FRAG = 1 << 31
+
 
 class BaseTransport(abc.ABC):
+    # Space reserved at the start of outgoing messages for transport-level framing
+    FRAME_HEADER_LEN = 0
+    # Message bodies at least this big get passed along as-is instead of being copied
+    LARGE_BODY_BYTES = 16 * 1024
+
+    def __init__(self):
+        # Scratch codecs reused across calls on this connection. Anything using them
+        # must reset() first and be done with them before its next `await`.
+        self.packer = Packer()
+        self.unpacker = Unpacker(b"")
+
     @abc.abstractmethod
     async def write_msg_bytes(self, msg: bytes):
         pass
@@ -35,26 +45,59 @@ class BaseTransport(abc.ABC):
     def close(self):
         pass
 
-    async def write_msg(self, header: RPCMsg, body: bytes) -> None:
-        p = xdrlib.Packer()
-        RPCMsg.pack(p, header)
-        p.pack_fstring(len(body), body)
-        await self.write_msg_bytes(p.get_buffer())
+    async def write_framed_msg_bytes(self, buf: bytearray, tail: bytes = b""):
+        """
+        Write a message preceded by FRAME_HEADER_LEN bytes of scratch space
+
+        `tail` is sent directly after `buf`, so large payloads needn't be copied into it.
+        """
+        await self.write_msg_bytes(bytes(buf[self.FRAME_HEADER_LEN:]) + tail)
+
+    def _pack_msg(self, header: Union[RPCMsg, bytes], body: bytes) -> Tuple[bytearray, bytes]:
+        """Pack a message for write_framed_msg_bytes(), returning `buf` and `tail`"""
+        p = self.packer
+        p.reset()
+        # Zero-filled placeholder the transport can write its framing into
+        p.pack_fopaque(self.FRAME_HEADER_LEN, b"")
+        if isinstance(header, RPCMsg):
+            RPCMsg.pack(p, header)
+        else:
+            p.pack_fopaque(len(header), header)
+        body_len = len(body)
+        if body_len >= self.LARGE_BODY_BYTES and not body_len % 4:
+            # Already 4-byte aligned so no padding needed, send it as its own buffer
+            return p.take_buffer(), body
+        p.pack_fstring(body_len, body)
+        return p.take_buffer(), b""
+
+    async def write_msg(self, header: Union[RPCMsg, bytes], body: bytes) -> None:
+        """Write a message, `header` may be an RPCMsg that was already packed"""
+        await self.write_framed_msg_bytes(*self._pack_msg(header, body))
+
+    async def write_msgs(self, msgs: Iterable[Tuple[Union[RPCMsg, bytes], bytes]]) -> None:
+        """Write several messages, letting the transport batch them up if it can"""
+        for header, body in msgs:
+            await self.write_msg(header, body)
 
     async def read_msg(self) -> SPLIT_MSG:
         msg_bytes = await self.read_msg_bytes()
-        unpacker = xdrlib.Unpacker(msg_bytes)
+        unpacker = self.unpacker
+        unpacker.reset(msg_bytes)
         msg = RPCMsg.unpack(unpacker)
-        return msg, unpacker.get_buffer()[unpacker.get_position():]
+        # Hand back a view of the body rather than copying it out of the message
+        return msg, memoryview(msg_bytes)[unpacker.get_position():]
 
 
 class TCPTransport(BaseTransport):
     # 100KB, larger than UDP would allow anyway?
     MAX_MSG_BYTES = 100_000
+    FRAME_HEADER_LEN = 4
 
     def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        super().__init__()
         self.reader = reader
         self.writer = writer
+        self._drain_lock = asyncio.Lock()
 
     @property
     def closed(self):
@@ -65,30 +108,68 @@ class TCPTransport(BaseTransport):
         return self.writer.get_extra_info('peername')
 
     def close(self):
+        # May be called more than once, and uvloop won't touch a closed transport at all
+        if self.writer.is_closing():
+            return
         if self.writer.can_write_eof():
             self.writer.write_eof()
-        if not self.writer.is_closing():
-            self.writer.close()
+        self.writer.close()
 
     async def write_msg_bytes(self, msg: bytes):
         # Tack on the fragment size, mark as last frag
-        msg = struct.pack("!L", len(msg) | (1 << 31)) + msg
-        self.writer.write(msg)
-        await self.writer.drain()
+        self.writer.writelines((_U32.pack(len(msg) | LAST_FRAG), msg))
+        await self._drain()
+
+    @staticmethod
+    def _fill_record_mark(buf: bytearray, tail: bytes):
+        # Fill in the fragment size in the space left for it, mark as last frag
+        _U32.pack_into(buf, 0, (len(buf) + len(tail) - 4) | LAST_FRAG)
+
+    async def write_framed_msg_bytes(self, buf: bytearray, tail: bytes = b""):
+        self._fill_record_mark(buf, tail)
+        if tail:
+            # Scatter / gather write where the event loop supports it
+            self.writer.writelines((buf, tail))
+        else:
+            self.writer.write(buf)
+        await self._drain()
+
+    async def write_msgs(self, msgs: Iterable[Tuple[Union[RPCMsg, bytes], bytes]]) -> None:
+        # Hand everything to the socket in one go and only drain once
+        frames = []
+        for header, body in msgs:
+            buf, tail = self._pack_msg(header, body)
+            self._fill_record_mark(buf, tail)
+            frames.append(buf)
+            if tail:
+                frames.append(tail)
+        self.writer.writelines(frames)
+        await self._drain()
+
+    async def _drain(self):
+        # Multiple calls may be writing replies at once, and concurrent
+        # drain()s aren't supported before Python 3.10.
+        async with self._drain_lock:
+            await self.writer.drain()
+
+    async def _read_frag_header(self, total_len: int) -> Tuple[bool, int]:
+        frag_header = _U32.unpack(await self.reader.readexactly(4))[0]
+        frag_len = frag_header & ~LAST_FRAG
+        if total_len + frag_len > self.MAX_MSG_BYTES:
+            raise ValueError(f"Overly large RPC message! {total_len + frag_len}, {frag_len}")
+        return bool(frag_header & LAST_FRAG), frag_len
 
     async def read_msg_bytes(self) -> bytes:
-        last_frag = False
-        msg_bytes = BytesIO()
-        total_len = 0
+        last_frag, frag_len = await self._read_frag_header(0)
+        if last_frag:
+            # Nearly every message is a single fragment, no need to stitch anything together
+            return await self.reader.readexactly(frag_len)
+
+        msg_bytes = bytearray(await self.reader.readexactly(frag_len))
         while not last_frag:
-            frag_header = struct.unpack("!L", await self.reader.readexactly(4))[0]
-            last_frag = frag_header & (1 << 31)
-            frag_len = frag_header & (~(1 << 31))
-            total_len += frag_len
-            if total_len > self.MAX_MSG_BYTES:
-                raise ValueError(f"Overly large RPC message! {total_len}, {frag_len}")
-            msg_bytes.write(await self.reader.readexactly(frag_len))
-        return msg_bytes.getvalue()
+            last_frag, frag_len = await self._read_frag_header(len(msg_bytes))
+            msg_bytes += await self.reader.readexactly(frag_len)
+        return bytes(msg_bytes)
 
 
 class CallContext:
@@ -103,6 +184,7 @@ class Prog:
     vers: int
     min_vers: Optional[int] = None
     procs: Dict[int, Proc]
+    _handlers: Optional[Dict[int, Callable]] = None
 
     def supports_version(self, vers: int) -> bool:
         if self.min_vers is not None:
@@ -111,7 +193,11 @@ class Prog:
             return self.vers == vers
 
     def get_handler(self, proc_id) -> Callable:
-        return getattr(self, self.procs[proc_id].name)
+        handlers = self._handlers
+        if handlers is None:
+            # Resolve the bound methods once so dispatch is just a dict lookup
+            handlers = self._handlers = {pid: getattr(self, p.name) for pid, p in self.procs.items()}
+        return handlers[proc_id]
 
     @staticmethod
     def _make_reply_body(
@@ -141,20 +227,21 @@ class Prog:
             ) if reject_stat is not None else None,
         )
 
-    async def handle_proc_call(self, call_ctx: CallContext, proc_id: int, call_body: bytes) \
-            -> Union[ReplyBody, bytes]:
+    async def handle_proc_call(self, call_ctx: CallContext, proc_id: int, call_body: memoryview) \
+            -> Union[ReplyBody, bytearray]:
         proc = self.procs.get(proc_id)
         if proc is None:
             raise NotImplementedError()
 
-        unpacker = xdrlib.Unpacker(call_body)
-        argl = [arg_type.unpack(unpacker)
-                for arg_type in proc.arg_types]
+        unpacker = call_ctx.transport.unpacker
+        unpacker.reset(call_body)
+        argl = proc.unpack_args(unpacker)
         handler: Callable = self.get_handler(proc_id)
         rv = await handler(call_ctx, *argl)
         if isinstance(rv, ReplyBody):
             return rv
 
-        packer = xdrlib.Packer()
+        packer = call_ctx.transport.packer
+        packer.reset()
         proc.ret_type.pack(packer, rv)
-        return packer.get_buffer()
+        return packer.take_buffer()
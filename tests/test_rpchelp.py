@@ -0,0 +1,282 @@
+"""Check the generated Struct / Union codecs against plain field-by-field (un)packing"""
+import dataclasses
+import random
+import struct
+import xdrlib
+
+import pytest
+
+from shenaniganfs import rpchelp
+from shenaniganfs.generated import rfc1094, rfc1813, rfc1831, rfc1833_portmapper, rfc1833_rpcbind, statd
+from shenaniganfs.rpchelp import isinstance_or_subclass
+
+GENERATED_MODULES = (rfc1094, rfc1813, rfc1831, rfc1833_portmapper, rfc1833_rpcbind, statd)
+
+PACKER_CLASSES = [rpchelp.PyPacker]
+UNPACKER_CLASSES = [rpchelp.PyUnpacker]
+if rpchelp.Packer is not rpchelp.PyPacker:
+    PACKER_CLASSES.append(rpchelp.Packer)
+    UNPACKER_CLASSES.append(rpchelp.Unpacker)
+
+
+def _ref_pack_struct(cls, p, val, want_single=False):
+    fields = cls.get_fields()
+    if want_single and len(fields) == 1:
+        _ref_pack(fields[0].metadata["serializer"], p, val)
+        return
+    for field in fields:
+        _ref_pack(field.metadata["serializer"], p, getattr(val, field.name))
+
+
+def _ref_pack(serializer, p, val):
+    """Pack `val` the way rpchelp did before Struct / Union codecs were generated"""
+    if isinstance_or_subclass(serializer, rpchelp.LinkedList):
+        p.pack_list(val, lambda v: _ref_pack_struct(serializer, p, v, want_single=True))
+    elif isinstance_or_subclass(serializer, rpchelp.Struct):
+        _ref_pack_struct(serializer, p, val)
+    elif isinstance_or_subclass(serializer, rpchelp.Union):
+        switch_field = serializer.get_fields()[0]
+        sw_val = getattr(val, switch_field.name)
+        _ref_pack(switch_field.metadata["serializer"], p, sw_val)
+        name, typ = serializer._get_switch_details(sw_val)
+        if name is not None:
+            _ref_pack(typ, p, getattr(val, name))
+    elif isinstance(serializer, rpchelp.OptData):
+        if serializer.is_linked_list:
+            _ref_pack(serializer.typ, p, val)
+        elif val is None:
+            p.pack_bool(False)
+        else:
+            p.pack_bool(True)
+            _ref_pack(serializer.typ, p, val)
+    elif isinstance(serializer, rpchelp.Array):
+        def pack_one(v):
+            _ref_pack(serializer.base_type, p, v)
+        if serializer.fixed_len:
+            p.pack_farray(len(val), val, pack_one)
+        else:
+            p.pack_array(val, pack_one)
+    else:
+        # Primitives, enums and opaques were never specialized
+        serializer.pack(p, val)
+
+
+def _random_float(rng, fmt):
+    # Round-trip through the wire format so the value survives unpacking unchanged
+    return struct.unpack(fmt, struct.pack(fmt, rng.uniform(-1e6, 1e6)))[0]
+
+
+_RANDOM_PRIMITIVES = {
+    rpchelp.r_uint: lambda rng: rng.getrandbits(32),
+    rpchelp.r_int: lambda rng: rng.randint(-2 ** 31, 2 ** 31 - 1),
+    rpchelp.r_uhyper: lambda rng: rng.getrandbits(64),
+    rpchelp.r_hyper: lambda rng: rng.randint(-2 ** 63, 2 ** 63 - 1),
+    rpchelp.r_bool: lambda rng: rng.random() < 0.5,
+    rpchelp.r_float: lambda rng: _random_float(rng, "!f"),
+    rpchelp.r_double: lambda rng: _random_float(rng, "!d"),
+    rpchelp.r_opaque: lambda rng: bytes(rng.getrandbits(8) for _ in range(rng.randint(0, 9))),
+    rpchelp.r_void: lambda rng: None,
+}
+
+
+def _random_list_len(rng, depth, max_len=None):
+    n = rng.randint(0, 3 if depth < 3 else 0)
+    return n if max_len is None else min(n, max_len)
+
+
+def _random_value(serializer, rng, depth=0):
+    if isinstance_or_subclass(serializer, rpchelp.Enum):
+        return rng.choice(list(serializer))
+    if isinstance_or_subclass(serializer, rpchelp.LinkedList):
+        fields = serializer.get_fields()
+        if len(fields) == 1:
+            make_item = lambda: _random_value(fields[0].metadata["serializer"], rng, depth + 1)
+        else:
+            make_item = lambda: _random_struct(serializer, rng, depth + 1)
+        return [make_item() for _ in range(_random_list_len(rng, depth))]
+    if isinstance_or_subclass(serializer, rpchelp.Struct):
+        return _random_struct(serializer, rng, depth + 1)
+    if isinstance_or_subclass(serializer, rpchelp.Union):
+        switch_field = serializer.get_fields()[0]
+        sw_val = rng.choice([k for k in serializer.SWITCH_OPTIONS if k is not None])
+        name, typ = serializer._get_switch_details(sw_val)
+        if name is None:
+            return serializer(sw_val)
+        return serializer(sw_val, **{name: _random_value(typ, rng, depth + 1)})
+    if isinstance(serializer, rpchelp.OptData):
+        if serializer.is_linked_list or rng.random() < 0.7:
+            return _random_value(serializer.typ, rng, depth + 1)
+        return None
+    if isinstance(serializer, rpchelp.Array):
+        if serializer.fixed_len:
+            n = serializer.length
+        else:
+            n = _random_list_len(rng, depth, serializer.length)
+        return [_random_value(serializer.base_type, rng, depth + 1) for _ in range(n)]
+    if isinstance(serializer, rpchelp.Opaque):
+        if serializer.fixed_len:
+            n = serializer.length
+        else:
+            n = min(rng.randint(0, 9), serializer.length or 9)
+        return bytes(rng.getrandbits(8) for _ in range(n))
+    return _RANDOM_PRIMITIVES[serializer](rng)
+
+
+def _random_struct(cls, rng, depth):
+    return cls(**{
+        f.name: _random_value(f.metadata["serializer"], rng, depth)
+        for f in cls.get_fields()
+    })
+
+
+def _generated_types():
+    for module in GENERATED_MODULES:
+        for val in vars(module).values():
+            if not isinstance(val, type) or val.__module__ != module.__name__:
+                continue
+            if issubclass(val, (rpchelp.Struct, rpchelp.Union)):
+                yield val
+
+
+def _ref_bytes(serializer, val):
+    p = xdrlib.Packer()
+    _ref_pack(serializer, p, val)
+    return p.get_buffer()
+
+
+def _packed(serializer, packer_cls, val):
+    p = packer_cls()
+    serializer.pack(p, val)
+    return p.get_buffer()
+
+
+@pytest.mark.parametrize("packer_cls,unpacker_cls", zip(PACKER_CLASSES, UNPACKER_CLASSES))
+@pytest.mark.parametrize("typ", list(_generated_types()), ids=lambda t: f"{t.__module__}.{t.__name__}")
+def test_generated_types_match_field_by_field(typ, packer_cls, unpacker_cls):
+    rng = random.Random(typ.__name__)
+    for _ in range(20):
+        val = _random_value(typ, rng)
+        expected = _ref_bytes(typ, val)
+        assert _packed(typ, packer_cls, val) == expected
+        up = unpacker_cls(expected)
+        assert typ.unpack(up) == val
+        up.done()
+
+
+class _Color(rpchelp.Enum):
+    RED = 0
+    GREEN = 1
+
+
+@dataclasses.dataclass
+class _FixedRun(rpchelp.Struct):
+    count: int = rpchelp.rpc_field(rpchelp.r_uint)
+    flag: bool = rpchelp.rpc_field(rpchelp.r_bool)
+    color: _Color = rpchelp.rpc_field(_Color)
+    size: int = rpchelp.rpc_field(rpchelp.r_uhyper)
+    # Not fixed-size, ends the run
+    name: bytes = rpchelp.rpc_field(rpchelp.r_opaque)
+    offset: int = rpchelp.rpc_field(rpchelp.r_hyper)
+
+
+@dataclasses.dataclass
+class _FixedRunPlus(_FixedRun):
+    extra: int = rpchelp.rpc_field(rpchelp.r_int, default=7)
+
+
+def _fixed_run(**kwargs):
+    return _FixedRun(**{"count": 1, "flag": True, "color": _Color.GREEN, "size": 2, "name": b"x", "offset": -3, **kwargs})
+
+
+@pytest.mark.parametrize("packer_cls", PACKER_CLASSES)
+@pytest.mark.parametrize("flag", [5, "yes", [1], 0, "", []])
+def test_fixed_run_normalizes_bools(packer_cls, flag):
+    val = _fixed_run(flag=flag)
+    packed = _packed(_FixedRun, packer_cls, val)
+    assert packed == _ref_bytes(_FixedRun, val)
+    assert _FixedRun.unpack(rpchelp.Unpacker(packed)).flag is bool(flag)
+
+
+@pytest.mark.parametrize("unpacker_cls", UNPACKER_CLASSES)
+def test_fixed_run_converts_enums(unpacker_cls):
+    packed = _ref_bytes(_FixedRun, _fixed_run(color=1))
+    val = _FixedRun.unpack(unpacker_cls(packed))
+    assert val.color is _Color.GREEN
+    assert val.flag is True
+
+
+@pytest.mark.parametrize("unpacker_cls", UNPACKER_CLASSES)
+def test_fixed_run_truncated(unpacker_cls):
+    packed = _ref_bytes(_FixedRun, _fixed_run())
+    with pytest.raises(EOFError):
+        _FixedRun.unpack(unpacker_cls(packed[:10]))
+
+
+@pytest.mark.parametrize("packer_cls", PACKER_CLASSES)
+@pytest.mark.parametrize("field,bad_val", [("count", 2 ** 32), ("count", -1), ("count", 1.5), ("color", 2 ** 31)])
+def test_fixed_run_fallback_raises_conversion_error(packer_cls, field, bad_val):
+    with pytest.raises(xdrlib.ConversionError):
+        _packed(_FixedRun, packer_cls, _fixed_run(**{field: bad_val}))
+
+
+@pytest.mark.parametrize("packer_cls", PACKER_CLASSES)
+def test_fixed_run_fallback_matches_packers(packer_cls):
+    # Out of range for struct, but pack_uhyper() masks it
+    val = _fixed_run(size=-1)
+    assert _packed(_FixedRun, packer_cls, val) == _ref_bytes(_FixedRun, val)
+
+
+@dataclasses.dataclass
+class _IntList(rpchelp.LinkedList):
+    val: int = rpchelp.rpc_field(rpchelp.r_uint)
+
+
+@dataclasses.dataclass
+class _PairList(rpchelp.LinkedList):
+    a: int = rpchelp.rpc_field(rpchelp.r_uint)
+    b: bytes = rpchelp.rpc_field(rpchelp.r_opaque)
+
+
+@dataclasses.dataclass
+class _Wrapped(rpchelp.Struct):
+    val: int = rpchelp.rpc_field(rpchelp.r_uint)
+
+
+@pytest.mark.parametrize("packer_cls,unpacker_cls", zip(PACKER_CLASSES, UNPACKER_CLASSES))
+def test_want_single(packer_cls, unpacker_cls):
+    # Single-field structs (un)pack the bare value when asked to
+    p = packer_cls()
+    _Wrapped.pack(p, 5, want_single=True)
+    assert p.get_buffer() == _packed(_Wrapped, packer_cls, _Wrapped(5)) == b"\x00\x00\x00\x05"
+    assert _Wrapped.unpack(unpacker_cls(p.get_buffer()), want_single=True) == 5
+    assert _Wrapped.unpack(unpacker_cls(p.get_buffer())) == _Wrapped(5)
+
+    # Multi-field structs ignore want_single
+    p = packer_cls()
+    _FixedRun.pack(p, _fixed_run(), want_single=True)
+    assert p.get_buffer() == _ref_bytes(_FixedRun, _fixed_run())
+    assert _FixedRun.unpack(unpacker_cls(p.get_buffer()), want_single=True) == _fixed_run()
+
+
+@pytest.mark.parametrize("packer_cls,unpacker_cls", zip(PACKER_CLASSES, UNPACKER_CLASSES))
+@pytest.mark.parametrize("typ,val", [
+    (_IntList, []),
+    (_IntList, [1, 2, 3]),
+    (_PairList, [_PairList(1, b"a"), _PairList(2, b"bcde")]),
+])
+def test_linked_list(packer_cls, unpacker_cls, typ, val):
+    packed = _packed(typ, packer_cls, val)
+    assert packed == _ref_bytes(typ, val)
+    assert typ.unpack(unpacker_cls(packed)) == val
+
+
+@pytest.mark.parametrize("packer_cls,unpacker_cls", zip(PACKER_CLASSES, UNPACKER_CLASSES))
+def test_subclass_gets_its_own_codec(packer_cls, unpacker_cls):
+    # Make sure the parent's codec is built and cached first
+    _packed(_FixedRun, packer_cls, _fixed_run())
+    val = _FixedRunPlus(**dataclasses.asdict(_fixed_run()), extra=-9)
+    packed = _packed(_FixedRunPlus, packer_cls, val)
+    assert packed == _ref_bytes(_FixedRunPlus, val)
+    assert packed.endswith(b"\xff\xff\xff\xf7")
+    assert _FixedRunPlus.unpack(unpacker_cls(packed)) == val
+    assert _FixedRunPlus.__dict__["_codec"] is not _FixedRun.__dict__["_codec"]
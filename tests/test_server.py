@@ -0,0 +1,127 @@
+"""Check how TCPTransportServer handles pipelined calls on a single connection"""
+import asyncio
+
+import pytest
+
+import shenaniganfs.generated.rfc1833_rpcbind as rb
+from shenaniganfs.server import SimpleRPCBindClient, TCPTransportServer
+
+NULL = 0
+GETTIME = 6
+
+
+class _TestProg(rb.RPCBPROG_4_SERVER):
+    def __init__(self):
+        super().__init__()
+        self.null_calls = 0
+
+    async def NULL(self, call_ctx):
+        self.null_calls += 1
+
+
+class _SlowProg(_TestProg):
+    """GETTIME doesn't reply until it's released"""
+    def __init__(self):
+        super().__init__()
+        # Created in the test's event loop
+        self.gettime_started: asyncio.Event = None
+        self.release_gettime: asyncio.Event = None
+
+    async def GETTIME(self, call_ctx):
+        self.gettime_started.set()
+        await self.release_gettime.wait()
+        return 1234
+
+
+class _FailingProg(_TestProg):
+    async def GETTIME(self, call_ctx):
+        raise RuntimeError("boom")
+
+
+async def _serve(prog):
+    transport_server = TCPTransportServer("127.0.0.1", 0)
+    transport_server.register_prog(prog)
+    server = await transport_server.start()
+    return server, server.sockets[0].getsockname()[1]
+
+
+def _run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 10))
+
+
+@pytest.mark.parametrize("calls_before_failure", [0, 2])
+def test_no_calls_handled_after_failure(calls_before_failure):
+    async def main():
+        prog = _FailingProg()
+        server, port = await _serve(prog)
+        client = SimpleRPCBindClient("127.0.0.1", port)
+        await client.connect()
+        calls = [(NULL, [])] * calls_before_failure + [(GETTIME, [])] + [(NULL, [])] * 15
+        # All in one write, so the server has every call buffered before the failing one runs
+        try:
+            await client.send_many(calls)
+        except asyncio.CancelledError:
+            # Server hung up on us, as expected
+            pass
+        else:
+            raise AssertionError("Connection should have been closed")
+        # Give anything the server wrongly kicked off a chance to run
+        await asyncio.sleep(0.05)
+        client.disconnect()
+        server.close()
+        return prog.null_calls
+
+    assert _run(main()) == calls_before_failure
+
+
+def test_slow_call_does_not_block_fast_call():
+    async def main():
+        prog = _SlowProg()
+        prog.gettime_started = asyncio.Event()
+        prog.release_gettime = asyncio.Event()
+        server, port = await _serve(prog)
+        finished = []
+
+        async def call(client, name):
+            reply = await getattr(client, name)()
+            finished.append(name)
+            if name == "NULL":
+                # Only let the slow call finish once the fast one has been answered
+                prog.release_gettime.set()
+            return reply
+
+        async with SimpleRPCBindClient("127.0.0.1", port) as client:
+            slow = asyncio.ensure_future(call(client, "GETTIME"))
+            await prog.gettime_started.wait()
+            fast = await call(client, "NULL")
+            slow = await slow
+        server.close()
+        return finished, slow, fast
+
+    finished, slow, fast = _run(main())
+    # Replies came back out of order, but each still matched up with its call
+    assert finished == ["NULL", "GETTIME"]
+    assert slow.success and slow.body == 1234
+    assert fast.success and fast.body is None
+
+
+def test_in_flight_replies_sent_after_half_close():
+    async def main():
+        prog = _SlowProg()
+        prog.gettime_started = asyncio.Event()
+        prog.release_gettime = asyncio.Event()
+        server, port = await _serve(prog)
+        async with SimpleRPCBindClient("127.0.0.1", port) as client:
+            slow = asyncio.ensure_future(client.GETTIME())
+            await prog.gettime_started.wait()
+            # Done sending, but still waiting on the reply
+            client.transport.writer.write_eof()
+            # Make sure the server has seen the EOF before the handler finishes
+            await asyncio.sleep(0.05)
+            prog.release_gettime.set()
+            reply = await slow
+        server.close()
+        return reply
+
+    reply = _run(main())
+    assert reply.success and reply.body == 1234
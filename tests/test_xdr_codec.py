@@ -0,0 +1,70 @@
+"""Check the compiled XDR codec against the pure-Python one"""
+import math
+
+import pytest
+
+from shenaniganfs import rpchelp
+
+_xdr_fast = pytest.importorskip("shenaniganfs._xdr_fast")
+
+PACK_CASES = [
+    ("pack_uint", [0, 1, 0xFFFFFFFF, 0x100000000, -1, 1.5, "x"]),
+    ("pack_int", [0, -1, 0x7FFFFFFF, -0x80000000, 0x80000000, 1.5, "x"]),
+    ("pack_bool", [True, False, 0, 5, [], [1]]),
+    ("pack_uhyper", [0, 2 ** 64 - 1, -1, 2 ** 64, "x"]),
+    ("pack_hyper", [0, -1, -2 ** 63, 2 ** 63 - 1]),
+    ("pack_float", [0.0, -1.5, 2, 3.4028235e38, 1e300, -1e39, math.inf, math.nan, "x"]),
+    ("pack_double", [0.0, -1.5, 2, 1e300, math.inf, math.nan, "x"]),
+    ("pack_opaque", [b"", b"a", b"abcd", b"abcde", bytearray(b"xyz")]),
+]
+
+
+def _pack(packer_cls, method, val):
+    p = packer_cls()
+    try:
+        getattr(p, method)(val)
+    except Exception as e:
+        return type(e)
+    return p.get_buffer()
+
+
+@pytest.mark.parametrize("method,val", [(m, v) for m, vals in PACK_CASES for v in vals])
+def test_pack_parity(method, val):
+    assert _pack(_xdr_fast.Packer, method, val) == _pack(rpchelp.PyPacker, method, val)
+
+
+def test_pack_fstring_parity():
+    for n, val in ((0, b""), (3, b"ab"), (4, b"abcdef"), (5, b"abcde")):
+        fast, py = _xdr_fast.Packer(), rpchelp.PyPacker()
+        fast.pack_fstring(n, val)
+        py.pack_fstring(n, val)
+        assert fast.get_buffer() == py.get_buffer()
+
+
+UNPACK_METHODS = [
+    "unpack_uint", "unpack_int", "unpack_bool", "unpack_uhyper", "unpack_hyper",
+    "unpack_float", "unpack_double", "unpack_opaque",
+]
+
+
+def _unpack(unpacker_cls, method, data):
+    up = unpacker_cls(data)
+    try:
+        val = getattr(up, method)()
+    except Exception as e:
+        return type(e)
+    # repr() so NaNs compare equal
+    return repr(val), type(val), up.get_position()
+
+
+@pytest.mark.parametrize("method", UNPACK_METHODS)
+@pytest.mark.parametrize("data", [
+    b"",
+    b"\x00\x00\x00",
+    b"\x7f\xff\xff\xff\xff\xff\xff\xff",
+    b"\x80\x00\x00\x00\x00\x00\x00\x01",
+    b"\x00\x00\x00\x03abc\x00",
+    memoryview(b"\x00\x00\x00\x02ab\x00\x00"),
+])
+def test_unpack_parity(method, data):
+    assert _unpack(_xdr_fast.Unpacker, method, data) == _unpack(rpchelp.PyUnpacker, method, data)